@@ -5,31 +5,267 @@ Simplified and refactored for modularity
 
 import os
 import json
+import hashlib
+import logging
 import asyncio
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Callable, Deque, Dict, List, Any, Optional, Set, Tuple
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from config import (
     SYSTEM_PROMPT, 
     MODEL_NAME, 
     MODEL_TEMPERATURE, 
     REACT_SAFETY_LIMIT, 
     RECENT_MESSAGES_LIMIT,
-    DEFAULT_HISTORY_FILE
+    MAX_MESSAGES_HARD_CAP,
+    DEFAULT_HISTORY_FILE,
+    MAX_STDOUT_CHARS,
+    MAX_LISTING_ITEMS,
+    MAX_SEARCH_MATCHES,
+    AGENT_CACHE_DIR,
+    AGENT_CACHE_MAX_FILES
 )
-from tools.base import ToolRegistry
-from tools.file_ops import FileOperationTools
-from tools.shell_exec import ShellOperationTools
-from tools.web_search import WebSearchTools
+from gemini_contents import SYSTEM_CONTENT, MODEL_ACK_CONTENT
+from eviction import evict, tool_result_part
+from tools.base import ToolRegistry, tool_response_dumps
+from tools import history_store
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Message:
+    """A single conversation history message"""
+    role: str
+    content: str
+    timestamp: Optional[float] = None
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Message":
+        """Create a message from its stored dict form"""
+        return cls(
+            role=data.get('role', 'user'),
+            content=data.get('content', ''),
+            timestamp=data.get('timestamp')
+        )
+
+
+def _tail(items: Deque, limit: int) -> List:
+    """Return the last `limit` items of a deque in order, without copying the rest"""
+    tail = list(islice(reversed(items), limit))
+    tail.reverse()
+    return tail
+
+
+def _spill_to_cache(cache_dir: Path, text: str) -> Optional[str]:
+    """Store full tool output in the agent cache, return its path relative to the working directory"""
+    data = text.encode('utf-8', errors='replace')
+    file_name = f"{hashlib.sha1(data).hexdigest()[:16]}.txt"
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        cache_file = cache_dir / file_name
+        if cache_file.exists():
+            # Refresh the age of reused output so pruning keeps it
+            os.utime(cache_file)
+        else:
+            cache_file.write_bytes(data)
+            _prune_cache(cache_dir)
+    except OSError:
+        return None
+    return f"{cache_dir.name}/{file_name}"
+
+
+def _prune_cache(cache_dir: Path) -> None:
+    """Delete the oldest cached outputs beyond AGENT_CACHE_MAX_FILES"""
+    try:
+        with os.scandir(cache_dir) as entries:
+            cached = [(entry.stat().st_mtime, entry.path) for entry in entries if entry.is_file()]
+    except OSError:
+        return
+    if len(cached) <= AGENT_CACHE_MAX_FILES:
+        return
+    cached.sort()
+    for _, path in cached[:-AGENT_CACHE_MAX_FILES]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _truncation_note(omitted: str, cache_dir: Path, full_text: str) -> str:
+    """Build the marker appended to truncated tool output"""
+    cache_path = _spill_to_cache(cache_dir, full_text)
+    if cache_path:
+        return f"[...{omitted} truncated; full output saved to {cache_path}, inspect it with shell_exec (head, grep, sed -n) if needed]"
+    return f"[...{omitted} truncated; re-run with grep/head if needed]"
+
+
+def _truncate_output(text: str, cache_dir: Path) -> str:
+    """Cut long command output to MAX_STDOUT_CHARS characters"""
+    if len(text) <= MAX_STDOUT_CHARS:
+        return text
+    note = _truncation_note(f"{len(text) - MAX_STDOUT_CHARS} more chars", cache_dir, text)
+    return f"{text[:MAX_STDOUT_CHARS]}\n{note}"
+
+
+def _fmt_read_file(result: Dict, cache_dir: Path) -> str:
+    if result.get('encoding') == 'base64':
+        return f"Base64-encoded content from {result.get('path', 'unknown')}:\n\n{result.get('content', '')}"
+    return f"File content from {result.get('path', 'unknown')}:\n\n{result.get('content', '')}"
+
+
+def _fmt_write_file(result: Dict, cache_dir: Path) -> str:
+    return f"Successfully wrote to {result.get('path', 'unknown')} ({result.get('size', 0)} bytes)"
+
+
+def _listing_lines(dirs: List[Dict], files: List[Dict]) -> List[str]:
+    lines = []
+    if dirs:
+        lines.append("Directories:")
+        lines.extend(f"  📁 {d['name']}" for d in dirs)
+    if files:
+        lines.append("Files:")
+        lines.extend(f"  📄 {f['name']} ({f['size']} bytes)" for f in files)
+    else:
+        lines.append("")
+    return lines
+
+
+def _fmt_list_files(result: Dict, cache_dir: Path) -> str:
+    files = result.get('files', [])
+    dirs = result.get('directories', [])
+    parts = [f"Directory listing for {result.get('path', 'unknown')}:"]
+    if len(dirs) + len(files) > MAX_LISTING_ITEMS:
+        shown_dirs = dirs[:MAX_LISTING_ITEMS]
+        shown_files = files[:MAX_LISTING_ITEMS - len(shown_dirs)]
+        parts.extend(_listing_lines(shown_dirs, shown_files))
+        omitted = len(dirs) + len(files) - len(shown_dirs) - len(shown_files)
+        full_listing = "\n".join(_listing_lines(dirs, files))
+        parts.append(_truncation_note(f"{omitted} more items", cache_dir, full_listing))
+    else:
+        parts.extend(_listing_lines(dirs, files))
+    parts.append(f"Total items: {result.get('total_items', 0)}")
+    return "\n".join(parts)
+
+
+def _search_lines(matches: List[Dict]) -> List[str]:
+    lines = []
+    for match in matches:
+        lines.append(f"  📄 {match['file']}: {match['matches']} matches")
+        if match.get('sample_matches'):
+            lines.append(f"    Examples: {', '.join(match['sample_matches'][:3])}")
+    return lines
+
+
+def _fmt_search_files(result: Dict, cache_dir: Path) -> str:
+    matches = result.get('matches', [])
+    parts = [f"Search results for '{result.get('pattern', '')}' in {result.get('search_path', 'unknown')}:"]
+    if matches:
+        parts.extend(_search_lines(matches[:MAX_SEARCH_MATCHES]))
+        if len(matches) > MAX_SEARCH_MATCHES:
+            full_results = "\n".join(_search_lines(matches))
+            parts.append(_truncation_note(f"{len(matches) - MAX_SEARCH_MATCHES} more files", cache_dir, full_results))
+        parts.append("")
+    else:
+        parts.append("No matches found.")
+    parts.append(f"Total files with matches: {result.get('total_files_with_matches', 0)}")
+    if result.get('truncated'):
+        parts.append(f"Search stopped after {result.get('total_matches', 0)} matches; narrow the pattern or path to see more.")
+    return "\n".join(parts)
+
+
+def _fmt_shell_exec(result: Dict, cache_dir: Path) -> str:
+    stdout = result.get('stdout', '').strip()
+    stderr = result.get('stderr', '').strip()
+    parts = [
+        f"Shell command executed: {result.get('command', 'unknown')}",
+        f"Exit code: {result.get('exit_code', 0)}"
+    ]
+    if stdout:
+        parts.append(f"Output:\n{_truncate_output(stdout, cache_dir)}")
+    if stderr:
+        parts.append(f"Error output:\n{_truncate_output(stderr, cache_dir)}")
+    parts.append(f"Working directory: {result.get('working_directory', 'unknown')}")
+    return "\n".join(parts)
+
+
+def _fmt_web_search(result: Dict, cache_dir: Path) -> str:
+    results = result.get('results', [])
+    parts = [f"Web search results for '{result.get('query', 'unknown')}':"]
+    if results:
+        for i, search_result in enumerate(results[:5], 1):  # Show top 5 results
+            parts.append(f"{i}. {search_result.get('title', 'No title')}")
+            parts.append(f"   {search_result.get('description', 'No description')}")
+            parts.append(f"   🔗 {search_result.get('url', 'No URL')}\n")
+    else:
+        parts.append("No search results found.")
+    parts.append(f"Total results: {result.get('results_count', 0)}")
+    return "\n".join(parts)
+
+
+# Result formatters for successful tool calls, keyed by tool name.
+# Tools without an entry fall back to the result serialized as JSON.
+_FORMATTERS: Dict[str, Callable[[Dict, Path], str]] = {
+    "read_file": _fmt_read_file,
+    "write_file": _fmt_write_file,
+    "list_files": _fmt_list_files,
+    "search_files": _fmt_search_files,
+    "shell_exec": _fmt_shell_exec,
+    "web_search": _fmt_web_search,
+}
+
+# Tools whose formatter also renders unsuccessful results (e.g. a shell
+# command exiting nonzero, whose output still needs truncating)
+_FORMAT_UNSUCCESSFUL = frozenset({"shell_exec"})
+
+
+def _build_formatter(tool_names: List[str], cache_dir: Path) -> Callable[[str, Dict], str]:
+    """Build a tool result formatter specialized for the registered tools
+    
+    Only formatters of registered tools are kept and the cache directory is
+    bound up front, so formatting a result is a single dict lookup.
+    """
+    get_formatter = {name: _FORMATTERS[name] for name in tool_names if name in _FORMATTERS}.get
+    get_unsuccessful_formatter = {
+        name: _FORMATTERS[name] for name in tool_names if name in _FORMATTERS and name in _FORMAT_UNSUCCESSFUL
+    }.get
+    
+    def format_result(tool_name: str, result: Dict) -> str:
+        if "error" in result:
+            result_text = f"Tool {tool_name} failed: {result['error']}"
+        elif result.get("success"):
+            formatter = get_formatter(tool_name)
+            result_text = formatter(result, cache_dir) if formatter else f"Tool {tool_name} completed: {tool_response_dumps(result).decode('utf-8')}"
+        else:
+            formatter = get_unsuccessful_formatter(tool_name)
+            if formatter:
+                result_text = formatter(result, cache_dir)
+            else:
+                dumped = tool_response_dumps(result).decode('utf-8')
+                result_text = f"Tool {tool_name} result: {_truncate_output(dumped, cache_dir)}"
+        
+        return result_text
+    
+    return format_result
 
 
 class CodingAgent:
     """Main coding agent with modular tool system"""
     
-    def __init__(self, api_key: str, working_directory: str = ".", history_file: str = DEFAULT_HISTORY_FILE):
+    def __init__(self, api_key: str, working_directory: str = ".", history_file: str = DEFAULT_HISTORY_FILE,
+                 concurrent_tools: bool = True):
         """
         Initialize the CodingAgent with Gemini client and configuration.
         
@@ -37,6 +273,9 @@ class CodingAgent:
             api_key: Google Gemini API key
             working_directory: Directory where the agent operates
             history_file: File to store conversation history
+            concurrent_tools: Run the tool calls of a single model turn concurrently,
+                within each tool's max_concurrency. Disable to run them strictly
+                one after another.
         """
         # Initialize Gemini client
         self.client = genai.Client(api_key=api_key)
@@ -45,12 +284,43 @@ class CodingAgent:
         self.working_directory = Path(working_directory).resolve()
         self.working_directory.mkdir(parents=True, exist_ok=True)
         
-        # History management
+        # Full output of truncated tool results, readable by the model via read_file
+        self.cache_dir = self.working_directory / AGENT_CACHE_DIR
+        
+        # History management: the msgpack log is appended to on every message,
+        # the JSON file is a human-readable snapshot written on shutdown
         self.history_file = self.working_directory / history_file
-        self.messages: List[Dict] = []
+        self.history_log = self.history_file.with_suffix('.msgpack')
+        self.messages: Deque[Message] = deque(maxlen=MAX_MESSAGES_HARD_CAP)
+        
+        # Whether messages changed since the last JSON snapshot was saved
+        self._history_dirty = False
+        
+        # Number of messages dropped from memory to stay under the hard cap
+        self._archived = 0
+        
+        # Gemini contents converted from self.messages, kept index-aligned
+        # (None for skipped roles) so each message is only converted once
+        self._history_contents: Deque[Optional[types.Content]] = deque(maxlen=MAX_MESSAGES_HARD_CAP)
+        
+        # Hash of the last message if it is a user message, None otherwise
+        self._last_user_input_hash: Optional[int] = None
+        
+        # Gemini message list of the ReAct turn in progress, reused across turns
+        self._live_messages: List[types.Content] = []
+        
+        # Serializes react_loop calls, which share self._live_messages
+        self._turn_lock = asyncio.Lock()
+        
+        # Background task started by start_warmup()
+        self._warmup_task: Optional[asyncio.Task] = None
+        
+        # Background aclose() of tool registries replaced by change_working_directory()
+        self._closing_tasks: Set[asyncio.Task] = set()
         
         # Configuration
         self.model_name = MODEL_NAME
+        self.concurrent_tools = concurrent_tools
         self.system_prompt = SYSTEM_PROMPT
         
         # Initialize tool registry and register tools
@@ -62,6 +332,12 @@ class CodingAgent:
     
     def _setup_tools(self):
         """Set up and register all available tools"""
+        # Tool modules are imported here rather than at module load to keep
+        # importing the agent cheap
+        from tools.file_ops import FileOperationTools
+        from tools.shell_exec import ShellOperationTools
+        from tools.web_search import WebSearchTools
+        
         # Register file operation tools
         file_tools = FileOperationTools(self.working_directory)
         file_tools.register_all_tools(self.tool_registry)
@@ -73,53 +349,154 @@ class CodingAgent:
         # Register web search tools
         web_tools = WebSearchTools()
         web_tools.register_all_tools(self.tool_registry)
+        
+        # The tool declarations only change when the registry is rebuilt, so
+        # build the Gemini tool list and request config once per setup
+        self._tools_cached = [
+            types.Tool(function_declarations=self.tool_registry.get_function_declarations())
+        ]
+        self._gen_config_cached = types.GenerateContentConfig(
+            tools=self._tools_cached,
+            automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
+            temperature=MODEL_TEMPERATURE
+        )
+        
+        # Result formatter specialized for the tools registered above
+        self._formatter = _build_formatter(self.tool_registry.get_tool_names(), self.cache_dir)
     
     def load_history(self):
-        """Load conversation history from file"""
+        """Load recent conversation history from the append log (or a JSON snapshot)"""
         try:
-            if self.history_file.exists():
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.messages = data.get('messages', [])
-                    print(f"Loaded {len(self.messages)} messages from history")
+            if self.history_log.exists():
+                # Only the recent tail is needed to build the next request;
+                # older messages stay in the log
+                messages, total = history_store.load_tail(self.history_log, RECENT_MESSAGES_LIMIT * 2)
+                self._set_history(messages)
+                self._archived += total - len(messages)
+                print(f"Loaded {len(self.messages)} of {total} messages from history")
+            elif self.history_file.exists():
+                if orjson is not None:
+                    data = orjson.loads(self.history_file.read_bytes())
+                else:
+                    with open(self.history_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                # Seed the append log so later messages extend this snapshot
+                history_store.write_all(self.history_log, data.get('messages', []))
+                self._set_history(data.get('messages', []))
+                print(f"Loaded {len(self.messages)} messages from history")
             else:
                 print("No existing history file found, starting fresh")
-        except (json.JSONDecodeError, FileNotFoundError) as e:
+        except (json.JSONDecodeError, ValueError, OSError) as e:
             print(f"Error loading history: {e}")
-            self.messages = []
+            self._set_history([])
     
     def save_history(self):
-        """Save conversation history to file"""
+        """Save a JSON snapshot of the full conversation history for inspection
+        
+        Messages are already persisted to the append log as they are added,
+        so this is only needed on shutdown. Skipped if nothing changed since
+        the last save. The snapshot is built from the log, since only the
+        recent tail of the history is kept in memory.
+        """
+        if not self._history_dirty:
+            return
+        
         try:
+            if self.history_log.exists():
+                messages = history_store.load_all(self.history_log)
+            else:
+                messages = [asdict(message) for message in self.messages]
             history_data = {
-                'messages': self.messages,
+                'messages': messages,
                 'working_directory': str(self.working_directory),
                 'model_name': self.model_name
             }
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(history_data, f, indent=2, ensure_ascii=False)
-            print(f"Saved {len(self.messages)} messages to history")
+            if orjson is not None:
+                self.history_file.write_bytes(orjson.dumps(history_data, option=orjson.OPT_INDENT_2))
+            else:
+                with open(self.history_file, 'w', encoding='utf-8') as f:
+                    json.dump(history_data, f, indent=2, ensure_ascii=False)
+            self._history_dirty = False
+            print(f"Saved {len(messages)} messages to history")
         except Exception as e:
             print(f"Error saving history: {e}")
     
     def add_message(self, role: str, content: str):
         """Add a message to the conversation history"""
-        message = {
-            'role': role,
-            'content': content,
-            'timestamp': asyncio.get_event_loop().time() if asyncio.get_event_loop().is_running() else None
-        }
+        message = Message(role=role, content=content, timestamp=time.time())
+        self._append_history(message)
+        self._history_dirty = True
+        
+        try:
+            history_store.append_message(self.history_log, asdict(message))
+        except Exception as e:
+            print(f"Error saving history: {e}")
+    
+    @staticmethod
+    def _message_to_content(message: Message) -> Optional[types.Content]:
+        """Convert a history message to Gemini content (None if skipped)"""
+        role = message.role
+        
+        # Convert role to Gemini format
+        if role == "assistant":
+            role = "model"
+        elif role == "system":
+            return None
+        
+        return types.Content(
+            role=role,
+            parts=[types.Part(text=message.content)]
+        )
+    
+    def _append_history(self, message: Message):
+        """Append a message to the in-memory history, trimming to the hard cap"""
+        # Trim in user/assistant pairs so the history never starts mid-exchange
+        while len(self.messages) >= MAX_MESSAGES_HARD_CAP:
+            self.messages.popleft()
+            self._history_contents.popleft()
+            self._archived += 1
+            if self.messages and self.messages[0].role == "assistant":
+                self.messages.popleft()
+                self._history_contents.popleft()
+                self._archived += 1
+        
         self.messages.append(message)
+        self._history_contents.append(self._message_to_content(message))
+        self._last_user_input_hash = hash(message.content) if message.role == "user" else None
+    
+    def _set_history(self, messages: List[Dict]):
+        """Replace the in-memory history with stored messages, keeping only the newest under the cap"""
+        self.messages = deque(maxlen=MAX_MESSAGES_HARD_CAP)
+        self._history_contents = deque(maxlen=MAX_MESSAGES_HARD_CAP)
+        
+        skip = max(0, len(messages) - MAX_MESSAGES_HARD_CAP)
+        while skip < len(messages) and messages[skip].get("role") == "assistant":
+            skip += 1
+        self._archived = skip
+        self._last_user_input_hash = None
+        
+        for message in islice(messages, skip, None):
+            self._append_history(Message.from_dict(message))
     
-    def get_conversation_history(self) -> List[Dict]:
+    def get_conversation_history(self) -> List[Message]:
         """Get the current conversation history"""
-        return self.messages.copy()
+        return list(self.messages)
+    
+    def get_recent_messages(self, limit: int) -> List[Message]:
+        """Get the most recent `limit` messages of the conversation history"""
+        return _tail(self.messages, limit)
+    
+    def get_message_count(self) -> int:
+        """Get the total number of messages, including ones dropped from memory"""
+        return self._archived + len(self.messages)
     
     def clear_history(self):
         """Clear the conversation history"""
-        self.messages = []
-        if self.history_file.exists():
-            self.history_file.unlink()
+        self._set_history([])
+        self._history_dirty = True
+        for path in (self.history_log, self.history_file):
+            if path.exists():
+                path.unlink()
         print("Conversation history cleared")
     
     def get_working_directory(self) -> Path:
@@ -127,19 +504,60 @@ class CodingAgent:
         return self.working_directory
     
     def change_working_directory(self, new_directory: str):
-        """Change the working directory"""
+        """Change the working directory
+        
+        The old tools are closed in the background when called from a running
+        event loop; use achange_working_directory() to wait for that.
+        """
+        old_registry = self._switch_working_directory(new_directory)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No loop: resources tied to a finished loop were released with it
+            return
+        task = loop.create_task(old_registry.aclose())
+        self._closing_tasks.add(task)
+        task.add_done_callback(self._closing_tasks.discard)
+    
+    async def achange_working_directory(self, new_directory: str):
+        """Change the working directory, closing the old tools first"""
+        await self._switch_working_directory(new_directory).aclose()
+    
+    def _switch_working_directory(self, new_directory: str) -> ToolRegistry:
+        """Point the agent at a new working directory, returning the old tool registry"""
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        old_registry = self.tool_registry
+        
         new_path = Path(new_directory).resolve()
         new_path.mkdir(parents=True, exist_ok=True)
         self.working_directory = new_path
+        self.cache_dir = self.working_directory / AGENT_CACHE_DIR
         
         # Update history file location
         self.history_file = self.working_directory / self.history_file.name
+        self.history_log = self.working_directory / self.history_log.name
         
-        # Recreate tools with new working directory
+        # Recreate tools with new working directory (also rebuilds the cached
+        # tool list and request config)
         self.tool_registry = ToolRegistry()
         self._setup_tools()
         
         print(f"Changed working directory to: {self.working_directory}")
+        return old_registry
+    
+    def start_warmup(self):
+        """Warm up the tools in the background (call from a running event loop)"""
+        if self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(self.tool_registry.warmup())
+    
+    async def aclose(self):
+        """Release resources held by the tools (call on shutdown)"""
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        if self._closing_tasks:
+            await asyncio.gather(*self._closing_tasks, return_exceptions=True)
+        await self.tool_registry.aclose()
     
     def get_system_prompt(self) -> str:
         """Get the system prompt for the agent"""
@@ -158,39 +576,21 @@ class CodingAgent:
         return self.tool_registry.get_tool_names()
     
     def build_messages_list(self, user_input: str) -> List[types.Content]:
-        """Build messages list for Gemini API call"""
-        messages = []
-        
-        # Add system prompt
-        messages.append(types.Content(
-            role="user",
-            parts=[types.Part(text=self.system_prompt)]
-        ))
-        messages.append(types.Content(
-            role="model",
-            parts=[types.Part(text="I understand. I'm a coding agent ready to help with programming tasks and file operations.")]
-        ))
+        """Build messages list for Gemini API call
         
-        # Add conversation history (recent messages only)
-        recent_messages = self.messages[-RECENT_MESSAGES_LIMIT:] if len(self.messages) > RECENT_MESSAGES_LIMIT else self.messages
+        The shared system prompt contents come first, followed by the cached
+        contents of recent history; only the newest user input (if it is not
+        already in history) is materialized here. Tool results are appended
+        to the tail of the returned list by the ReAct loop.
+        """
+        messages = [SYSTEM_CONTENT, MODEL_ACK_CONTENT]
         
-        for message in recent_messages:
-            role = message.get("role", "user")
-            content = message.get("content", "")
-            
-            # Convert role to Gemini format
-            if role == "assistant":
-                role = "model"
-            elif role == "system":
-                continue
-            
-            messages.append(types.Content(
-                role=role,
-                parts=[types.Part(text=content)]
-            ))
+        # Add conversation history (recent messages only)
+        recent_contents = _tail(self._history_contents, RECENT_MESSAGES_LIMIT)
+        messages.extend(content for content in recent_contents if content is not None)
         
         # Add current user input if not already in history
-        if not recent_messages or recent_messages[-1].get("content") != user_input:
+        if self._last_user_input_hash != hash(user_input):
             messages.append(types.Content(
                 role="user", 
                 parts=[types.Part(text=user_input)]
@@ -203,45 +603,31 @@ class CodingAgent:
         text_responses = []
         function_calls = []
         
-        try:
-            if hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                
-                if hasattr(candidate, 'content') and candidate.content:
-                    content = candidate.content
-                    
-                    if hasattr(content, 'parts'):
-                        for part in content.parts:
-                            if hasattr(part, 'text') and part.text:
-                                text_responses.append(part.text)
-                            
-                            if hasattr(part, 'function_call') and part.function_call:
-                                function_calls.append(part.function_call)
-        except Exception as e:
-            print(f"Warning: Error parsing Gemini response: {e}")
-            response_str = str(response)
-            if response_str and response_str != str(response.__class__):
-                text_responses.append(f"Response parsing error, raw response: {response_str}")
+        candidate = (getattr(response, 'candidates', None) or [None])[0]
+        content = getattr(candidate, 'content', None)
+        parts = getattr(content, 'parts', None) or []
+        
+        if not parts:
+            # %r defers stringifying the (potentially large) response until
+            # debug logging is actually enabled
+            logger.debug("Gemini response contained no parts: %r", response)
+        
+        for part in parts:
+            if (text := getattr(part, 'text', None)):
+                text_responses.append(text)
+            
+            if (function_call := getattr(part, 'function_call', None)):
+                function_calls.append(function_call)
         
         return text_responses, function_calls
     
     async def _call_gemini(self, messages: List[types.Content]) -> Tuple[Any, Optional[str]]:
         """Call Gemini API with messages"""
         try:
-            tools = [
-                types.Tool(function_declarations=self.tool_registry.get_function_declarations())
-            ]
-            
-            config = types.GenerateContentConfig(
-                tools=tools,
-                automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
-                temperature=MODEL_TEMPERATURE
-            )
-            
-            response = self.client.models.generate_content(
+            response = await self.client.aio.models.generate_content(
                 model=self.model_name,
                 contents=messages,
-                config=config
+                config=self._gen_config_cached
             )
             
             return response, None
@@ -249,145 +635,119 @@ class CodingAgent:
             return None, f"Gemini API Error: {str(e)}"
     
     async def _execute_tool_calls(self, function_calls: List[Any]) -> List[Dict]:
-        """Execute tool calls using the tool registry"""
-        tool_results = []
+        """Execute tool calls using the tool registry
         
+        Calls are run concurrently when concurrent_tools is enabled; results
+        are returned in the same order as function_calls either way.
+        """
         for func_call in function_calls:
             print(f"🔧 Executing: {func_call.name}")
-            
-            # Get function arguments
-            args = func_call.args if hasattr(func_call, 'args') else {}
-            
-            # Execute tool through registry
-            result = await self.tool_registry.execute_tool(func_call.name, **args)
+        
+        # Get function arguments
+        calls = [(func_call.name, getattr(func_call, 'args', None) or {}) for func_call in function_calls]
+        
+        # Execute tools through registry
+        if self.concurrent_tools:
+            results = await self.tool_registry.execute_many(calls)
+        else:
+            results = [await self.tool_registry.execute_tool(name, **args) for name, args in calls]
+        
+        tool_results = []
+        for func_call, (name, _), result in zip(function_calls, calls, results):
+            if isinstance(result, BaseException):
+                result = {"error": f"Tool execution failed: {str(result)}"}
             
             if "error" not in result:
-                print(f"✓ Tool {func_call.name} completed")
+                print(f"✓ Tool {name} completed")
             else:
-                print(f"✗ Tool {func_call.name} failed: {result['error']}")
+                print(f"✗ Tool {name} failed: {result['error']}")
             
             tool_results.append({
-                "name": func_call.name,
+                "id": getattr(func_call, 'id', None),
+                "name": name,
                 "response": result
             })
         
         return tool_results
     
-    def _format_tool_result_for_gemini(self, tool_name: str, result: Dict) -> types.Content:
-        """Format tool execution result for Gemini response"""
-        if "error" in result:
-            result_text = f"Tool {tool_name} failed: {result['error']}"
-        elif "success" in result and result["success"]:
-            if tool_name == "read_file":
-                result_text = f"File content from {result.get('path', 'unknown')}:\n\n{result.get('content', '')}"
-            elif tool_name == "write_file":
-                result_text = f"Successfully wrote to {result.get('path', 'unknown')} ({result.get('size', 0)} bytes)"
-            elif tool_name == "list_files":
-                files = result.get('files', [])
-                dirs = result.get('directories', [])
-                result_text = f"Directory listing for {result.get('path', 'unknown')}:\n"
-                if dirs:
-                    result_text += "Directories:\n" + "\n".join([f"  📁 {d['name']}" for d in dirs]) + "\n"
-                if files:
-                    result_text += "Files:\n" + "\n".join([f"  📄 {f['name']} ({f['size']} bytes)" for f in files])
-                result_text += f"\nTotal items: {result.get('total_items', 0)}"
-            elif tool_name == "search_files":
-                matches = result.get('matches', [])
-                result_text = f"Search results for '{result.get('pattern', '')}' in {result.get('search_path', 'unknown')}:\n"
-                if matches:
-                    for match in matches:
-                        result_text += f"  📄 {match['file']}: {match['matches']} matches\n"
-                        if match.get('sample_matches'):
-                            result_text += f"    Examples: {', '.join(match['sample_matches'][:3])}\n"
-                else:
-                    result_text += "No matches found."
-                result_text += f"\nTotal files with matches: {result.get('total_files_with_matches', 0)}"
-            elif tool_name == "shell_exec":
-                command = result.get('command', 'unknown')
-                exit_code = result.get('exit_code', 0)
-                stdout = result.get('stdout', '').strip()
-                stderr = result.get('stderr', '').strip()
-                result_text = f"Shell command executed: {command}\n"
-                result_text += f"Exit code: {exit_code}\n"
-                if stdout:
-                    result_text += f"Output:\n{stdout}\n"
-                if stderr:
-                    result_text += f"Error output:\n{stderr}\n"
-                result_text += f"Working directory: {result.get('working_directory', 'unknown')}"
-            elif tool_name == "web_search":
-                query = result.get('query', 'unknown')
-                results = result.get('results', [])
-                result_text = f"Web search results for '{query}':\n"
-                if results:
-                    for i, search_result in enumerate(results[:5], 1):  # Show top 5 results
-                        title = search_result.get('title', 'No title')
-                        description = search_result.get('description', 'No description')
-                        url = search_result.get('url', 'No URL')
-                        result_text += f"{i}. {title}\n"
-                        result_text += f"   {description}\n"
-                        result_text += f"   🔗 {url}\n\n"
-                else:
-                    result_text += "No search results found.\n"
-                result_text += f"Total results: {result.get('results_count', 0)}"
-            else:
-                result_text = f"Tool {tool_name} completed: {result}"
-        else:
-            result_text = f"Tool {tool_name} result: {result}"
-        
-        return types.Content(
-            role="user",
-            parts=[types.Part(text=f"[Tool Result]\n{result_text}")]
-        )
+    def _format_tool_result_for_gemini(self, tool_name: str, result: Dict) -> str:
+        """Format tool execution result as text for Gemini"""
+        return self._formatter(tool_name, result)
     
-    def _format_tool_results_for_gemini(self, tool_results: List[Dict]) -> List[types.Content]:
-        """Format tool execution results for adding to conversation"""
-        formatted_results = []
+    def _format_tool_results_for_gemini(self, tool_results: List[Dict]) -> types.Content:
+        """Format the tool results of one model turn as a single content
         
+        Gemini expects one function response part per function call of the
+        model turn, in call order; the formatted result text is carried
+        inside each response.
+        """
+        parts = []
         for tool_result in tool_results:
             tool_name = tool_result.get("name", "unknown")
-            result = tool_result.get("response", {})
-            
-            formatted_content = self._format_tool_result_for_gemini(tool_name, result)
-            formatted_results.append(formatted_content)
-        
-        return formatted_results
+            result_text = self._format_tool_result_for_gemini(tool_name, tool_result.get("response", {}))
+            parts.append(tool_result_part(tool_name, result_text, tool_result.get("id")))
+        return types.Content(role="user", parts=parts)
     
     async def react_loop(self, user_input: str) -> str:
-        """Main ReAct loop for processing user input"""
+        """Main ReAct loop for processing user input
+        
+        Overlapping calls on one agent are run one after another, since each
+        turn builds on the history left by the previous one.
+        """
+        async with self._turn_lock:
+            return await self._react_turn(user_input)
+    
+    async def _react_turn(self, user_input: str) -> str:
+        """Run one ReAct turn (callers hold self._turn_lock)"""
         self.add_message("user", user_input)
         
-        messages = self.build_messages_list(user_input=user_input)
+        # The live message list is filled once per user turn and only grows
+        # at the tail while the loop runs
+        messages = self._live_messages
+        messages.extend(self.build_messages_list(user_input=user_input))
         
         last_complete_response = None
         iterations = 0
         
         print(f"🤖 Starting ReAct loop for: {user_input[:50]}{'...' if len(user_input) > 50 else ''}")
         
-        while iterations < REACT_SAFETY_LIMIT:
-            iterations += 1
-            print(f"🔄 ReAct iteration {iterations}")
-            
-            response, error = await self._call_gemini(messages)
-            if error:
-                error_msg = f"Error: {error}"
-                self.add_message("assistant", error_msg)
-                return error_msg
-            
-            text_responses, function_calls = self._parse_gemini_response(response)
-            
-            if text_responses:
-                last_complete_response = "\n".join(text_responses)
-                print(f"💬 Model response: {last_complete_response[:100]}{'...' if len(last_complete_response) > 100 else ''}")
-            
-            if not function_calls:
-                print("✅ No more tool calls needed, finishing ReAct loop")
-                break
+        try:
+            while iterations < REACT_SAFETY_LIMIT:
+                iterations += 1
+                print(f"🔄 ReAct iteration {iterations}")
                 
-            print(f"🔧 Found {len(function_calls)} tool call(s) to execute")
-            
-            tool_results = await self._execute_tool_calls(function_calls)
-            tool_result_contents = self._format_tool_results_for_gemini(tool_results)
-            messages.extend(tool_result_contents)
+                response, error = await self._call_gemini(messages)
+                if error:
+                    error_msg = f"Error: {error}"
+                    self.add_message("assistant", error_msg)
+                    return error_msg
+                
+                text_responses, function_calls = self._parse_gemini_response(response)
+                
+                if text_responses:
+                    last_complete_response = "\n".join(text_responses)
+                    print(f"💬 Model response: {last_complete_response[:100]}{'...' if len(last_complete_response) > 100 else ''}")
+                
+                if not function_calls:
+                    print("✅ No more tool calls needed, finishing ReAct loop")
+                    break
+                    
+                print(f"🔧 Found {len(function_calls)} tool call(s) to execute")
+                
+                # Keep the model turn carrying the function calls, followed by
+                # the tool results answering them
+                candidates = getattr(response, 'candidates', None)
+                model_content = candidates[0].content if candidates else None
+                if model_content is not None:
+                    messages.append(model_content)
+                
+                tool_results = await self._execute_tool_calls(function_calls)
+                messages.append(self._format_tool_results_for_gemini(tool_results))
+                
+                # Collapse stale tool output before it is re-sent on the next call
+                evict(messages)
+        finally:
+            messages.clear()
         
         final_response = last_complete_response or "I couldn't generate a response."
         
@@ -403,19 +763,10 @@ class CodingAgent:
         """Main entry point for processing user messages"""
         try:
             print(f"📝 Processing message: {user_input}")
-            result = await self.react_loop(user_input)
-            
-            self.save_history()
-            
-            return result
+            return await self.react_loop(user_input)
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)}"
             print(f"❌ Error processing message: {error_msg}")
+            logger.debug("Error processing message", exc_info=True)
             self.add_message("assistant", error_msg)
-            
-            try:
-                self.save_history()
-            except:
-                pass
-                
             return error_msg
@@ -10,6 +10,10 @@ from config import CLI_WELCOME_MESSAGE, CLI_EXAMPLES
 from agent import CodingAgent
 
 
+_EXIT_CMDS = frozenset({"exit", "quit"})
+_HELP_CMDS = frozenset({"help", "?"})
+
+
 async def main():
     """Main CLI interface"""
     print(CLI_WELCOME_MESSAGE)
@@ -30,8 +34,9 @@ async def main():
         print(f"📁 Working directory: {agent.get_working_directory()}")
         print(f"📝 History file: {agent.history_file}")
         print(f"🧠 Model: {agent.model_name}")
-        print(f"💬 Current message count: {len(agent.messages)}")
+        print(f"💬 Current message count: {agent.get_message_count()}")
         print(f"🛠️  Available tools: {', '.join(agent.list_tool_names())}")
+        agent.start_warmup()
     except Exception as e:
         print(f"❌ Failed to initialize agent: {e}")
         return
@@ -44,23 +49,25 @@ async def main():
     while True:
         try:
             user_input = input("\n💬 You: ").strip()
+            cmd = user_input.lower()
             
-            if user_input.lower() in ['exit', 'quit']:
+            if cmd in _EXIT_CMDS:
+                agent.save_history()
                 print("👋 Goodbye!")
                 break
-            elif user_input.lower() == 'clear':
+            elif cmd == 'clear':
                 agent.clear_history()
                 print("🗑️ History cleared!")
                 continue
-            elif user_input.lower() == 'history':
+            elif cmd == 'history':
                 print("\n📜 Recent conversation history:")
                 if not agent.messages:
                     print("  (No messages in history)")
                 else:
-                    for i, msg in enumerate(agent.messages[-10:], 1):
-                        role = msg.get("role", "unknown")
-                        content = msg.get("content", "")
-                        timestamp = msg.get("timestamp")
+                    for i, msg in enumerate(agent.get_recent_messages(10), 1):
+                        role = msg.role
+                        content = msg.content
+                        timestamp = msg.timestamp
                         
                         # Truncate long messages for display
                         if len(content) > 150:
@@ -70,7 +77,7 @@ async def main():
                         role_emoji = "🧑" if role == "user" else "🤖" if role == "assistant" else "⚙️"
                         print(f"  {i:2d}. {role_emoji} [{role}] {content}")
                 continue
-            elif user_input.lower() in ['help', '?']:
+            elif cmd in _HELP_CMDS:
                 print("\n🆘 Available commands:")
                 print("  • Type any message to chat with the agent")
                 print("  • 'history' - Show recent conversation history")
@@ -94,11 +101,14 @@ async def main():
             print(f"\n🤖 Agent: {response}")
             
         except KeyboardInterrupt:
+            agent.save_history()
             print("\n\n👋 Goodbye!")
             break
         except Exception as e:
             print(f"\n❌ Unexpected error: {e}")
             print("💡 Try again or type 'exit' to quit.")
+    
+    await agent.aclose()
 
 
 if __name__ == "__main__":
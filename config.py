@@ -55,6 +55,9 @@ SYSTEM_PROMPT = """You are a helpful coding agent that assists with programming
 * *"Run tests"* → Use `shell_exec` with the test command, then summarize.
 """
 
+# Model acknowledgement that follows the system prompt in every request
+MODEL_ACK_MESSAGE = "I understand. I'm a coding agent ready to help with programming tasks and file operations."
+
 # Model configuration
 MODEL_NAME = "gemini-2.5-flash"
 MODEL_TEMPERATURE = 0.7
@@ -63,6 +66,21 @@ MODEL_TEMPERATURE = 0.7
 REACT_SAFETY_LIMIT = 20
 RECENT_MESSAGES_LIMIT = 10
 
+# In-memory history cap; older messages are dropped (they remain in the history log)
+MAX_MESSAGES_HARD_CAP = 500
+
+# Tool result eviction configuration (applied to the live ReAct message list)
+EVICTION_SHELL_KEEP_TURNS = 2
+EVICTION_SHELL_OUTPUT_CHARS = 200
+EVICTION_ARCHIVE_DEPTH = 30
+
+# Tool output truncation; full output is stored under AGENT_CACHE_DIR in the working directory
+MAX_STDOUT_CHARS = 4000
+MAX_LISTING_ITEMS = 100
+MAX_SEARCH_MATCHES = 50
+AGENT_CACHE_DIR = ".agent_cache"
+AGENT_CACHE_MAX_FILES = 50
+
 # Default file names
 DEFAULT_HISTORY_FILE = "agent_history.json"
 
@@ -0,0 +1,105 @@
+"""
+Eviction of stale tool results from the live Gemini message list
+
+Tool results stay in the message list for every remaining ReAct iteration,
+so large listings and shell output get re-sent to Gemini on each call.
+evict() collapses the stale ones in place, newest results are kept verbatim.
+"""
+
+from typing import List, Optional, Tuple
+from google.genai import types
+
+from config import (
+    EVICTION_SHELL_KEEP_TURNS,
+    EVICTION_SHELL_OUTPUT_CHARS,
+    EVICTION_ARCHIVE_DEPTH
+)
+
+
+# Key of the formatted result text inside a function response
+TOOL_RESULT_KEY = "output"
+
+EVICTED_LISTING = "[prior listing evicted]"
+EVICTED_SHELL_OUTPUT = "\n[older shell output evicted]"
+ARCHIVED = "[archived]"
+
+
+def tool_result_part(tool_name: str, body: str, call_id: Optional[str] = None) -> types.Part:
+    """Build the function response part answering one function call"""
+    return types.Part(function_response=types.FunctionResponse(
+        id=call_id,
+        name=tool_name,
+        response={TOOL_RESULT_KEY: body}
+    ))
+
+
+def parse_tool_result(part: types.Part) -> Optional[Tuple[str, str]]:
+    """Split a tool result part into (tool_name, body), None if not a tool result"""
+    function_response = part.function_response
+    if function_response is None or not isinstance(function_response.response, dict):
+        return None
+    
+    body = function_response.response.get(TOOL_RESULT_KEY)
+    if not isinstance(body, str):
+        return None
+    
+    return function_response.name, body
+
+
+def evict(messages: List[types.Content]) -> None:
+    """Collapse stale tool results in the message list in place
+    
+    Walking from the newest message backwards:
+      1. only the most recent list_files result is kept, older ones are evicted
+      2. only the most recent failed tool result keeps its full error, older
+         failures are collapsed to their first line
+      3. shell_exec output older than EVICTION_SHELL_KEEP_TURNS tool turns is
+         cut to EVICTION_SHELL_OUTPUT_CHARS characters
+      4. tool results deeper than EVICTION_ARCHIVE_DEPTH messages are archived
+    
+    Only tool result parts are touched, so the system prompt and history
+    prefix stay byte-stable.
+    """
+    seen_listing = False
+    seen_failure = False
+    tool_turn = 0
+    
+    for index in range(len(messages) - 1, -1, -1):
+        content = messages[index]
+        parts = content.parts or []
+        if not any(parse_tool_result(part) for part in parts):
+            continue
+        
+        tool_turn += 1
+        depth = len(messages) - index
+        new_parts = list(parts)
+        changed = False
+        
+        for part_index in range(len(parts) - 1, -1, -1):
+            parsed = parse_tool_result(parts[part_index])
+            if parsed is None:
+                continue
+            
+            tool_name, body = parsed
+            new_body = body
+            
+            if depth > EVICTION_ARCHIVE_DEPTH:
+                new_body = ARCHIVED
+            elif body.startswith(f"Tool {tool_name} failed:"):
+                if seen_failure:
+                    new_body = body.split("\n", 1)[0]
+                seen_failure = True
+            elif tool_name == "list_files":
+                if seen_listing:
+                    new_body = EVICTED_LISTING
+                seen_listing = True
+            elif tool_name == "shell_exec" and tool_turn > EVICTION_SHELL_KEEP_TURNS:
+                if len(body) > EVICTION_SHELL_OUTPUT_CHARS and not body.endswith(EVICTED_SHELL_OUTPUT):
+                    new_body = body[:EVICTION_SHELL_OUTPUT_CHARS] + EVICTED_SHELL_OUTPUT
+            
+            if new_body != body:
+                new_parts[part_index] = tool_result_part(tool_name, new_body, parts[part_index].function_response.id)
+                changed = True
+        
+        if changed:
+            messages[index] = types.Content(role=content.role, parts=new_parts)
@@ -0,0 +1,22 @@
+"""
+Prebuilt Gemini contents for the Gemini Coding Agent
+
+The system prompt and model acknowledgement are constants, so their
+types.Content objects are built once at import time and shared by every
+request. The SDK does not mutate contents while building a request.
+"""
+
+from google.genai import types
+
+from config import SYSTEM_PROMPT, MODEL_ACK_MESSAGE
+
+
+SYSTEM_CONTENT = types.Content(
+    role="user",
+    parts=[types.Part(text=SYSTEM_PROMPT)]
+)
+
+MODEL_ACK_CONTENT = types.Content(
+    role="model",
+    parts=[types.Part(text=MODEL_ACK_MESSAGE)]
+)
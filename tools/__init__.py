@@ -3,9 +3,24 @@ Tools module for the Gemini Coding Agent
 Contains all tool implementations for file operations and shell execution
 """
 
-from .base import BaseTool, ToolRegistry
-from .file_ops import FileOperationTools
-from .shell_exec import ShellOperationTools
-from .web_search import WebSearchTools
+import importlib
 
-__all__ = ['BaseTool', 'ToolRegistry', 'FileOperationTools', 'ShellOperationTools', 'WebSearchTools']
+from .base import BaseTool, ToolRegistry, tool_response_dumps
+
+# Tool containers are imported on first access so that importing the
+# package (e.g. for ToolRegistry) does not load every tool module
+_LAZY_IMPORTS = {
+    'FileOperationTools': '.file_ops',
+    'ShellOperationTools': '.shell_exec',
+    'WebSearchTools': '.web_search',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name, __name__), name)
+
+
+__all__ = ['BaseTool', 'ToolRegistry', 'tool_response_dumps', 'FileOperationTools', 'ShellOperationTools', 'WebSearchTools']
@@ -3,16 +3,41 @@ Base tool interface and registry for the Gemini Coding Agent
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from functools import cached_property
+from typing import Dict, List, Any, Optional, Tuple
 from google.genai import types
 import asyncio
+import base64
+import json
 import os
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_default(obj: Any) -> Any:
+    """Serialize values JSON has no type for (bytes as base64, others via str)"""
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return base64.b64encode(obj).decode('ascii')
+    return str(obj)
+
+
+def tool_response_dumps(response: Dict[str, Any]) -> bytes:
+    """Serialize a tool response dict to UTF-8 JSON, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(response, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(response, default=_json_default, ensure_ascii=False).encode('utf-8')
+
 
 class BaseTool(ABC):
     """Abstract base class for all agent tools"""
     
+    # Maximum number of concurrent executions of this tool (None = unlimited)
+    max_concurrency: Optional[int] = None
+    
     @property
     @abstractmethod
     def name(self) -> str:
@@ -36,13 +61,26 @@ class BaseTool(ABC):
         """Execute the tool with given parameters"""
         pass
     
-    def get_function_declaration(self) -> types.FunctionDeclaration:
-        """Convert tool to Gemini FunctionDeclaration"""
+    async def warmup(self) -> None:
+        """Prepare the tool ahead of its first call (e.g. open connections)"""
+        pass
+    
+    async def aclose(self) -> None:
+        """Release resources held by the tool (e.g. network connections)"""
+        pass
+    
+    @cached_property
+    def _decl(self) -> types.FunctionDeclaration:
+        """Gemini FunctionDeclaration for this tool, built on first use"""
         return types.FunctionDeclaration(
             name=self.name,
             description=self.description,
             parameters=self.parameters
         )
+    
+    def get_function_declaration(self) -> types.FunctionDeclaration:
+        """Convert tool to Gemini FunctionDeclaration"""
+        return self._decl
 
 
 class ToolRegistry:
@@ -50,10 +88,21 @@ class ToolRegistry:
     
     def __init__(self):
         self._tools: Dict[str, BaseTool] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        
+        # Derived views of self._tools, rebuilt lazily after a register()
+        self._decls_cache: Optional[List[types.FunctionDeclaration]] = None
+        self._names_cache: Optional[List[str]] = None
     
     def register(self, tool: BaseTool) -> None:
         """Register a new tool"""
         self._tools[tool.name] = tool
+        self._decls_cache = None
+        self._names_cache = None
+        if tool.max_concurrency is not None:
+            self._semaphores[tool.name] = asyncio.Semaphore(tool.max_concurrency)
+        else:
+            self._semaphores.pop(tool.name, None)
     
     def get_tool(self, name: str) -> Optional[BaseTool]:
         """Get a tool by name"""
@@ -64,12 +113,16 @@ class ToolRegistry:
         return self._tools.copy()
     
     def get_tool_names(self) -> List[str]:
-        """Get list of all tool names"""
-        return list(self._tools.keys())
+        """Get list of all tool names (shared list, do not modify)"""
+        if self._names_cache is None:
+            self._names_cache = list(self._tools.keys())
+        return self._names_cache
     
     def get_function_declarations(self) -> List[types.FunctionDeclaration]:
-        """Get Gemini function declarations for all tools"""
-        return [tool.get_function_declaration() for tool in self._tools.values()]
+        """Get Gemini function declarations for all tools (shared list, do not modify)"""
+        if self._decls_cache is None:
+            self._decls_cache = [tool.get_function_declaration() for tool in self._tools.values()]
+        return self._decls_cache
     
     async def execute_tool(self, name: str, **kwargs) -> Dict[str, Any]:
         """Execute a tool by name"""
@@ -78,9 +131,37 @@ class ToolRegistry:
             return {"error": f"Unknown tool: {name}"}
         
         try:
-            return await tool.execute(**kwargs)
+            semaphore = self._semaphores.get(name)
+            if semaphore is None:
+                return await tool.execute(**kwargs)
+            async with semaphore:
+                return await tool.execute(**kwargs)
         except Exception as e:
             return {"error": f"Tool execution failed: {str(e)}"}
+    
+    async def execute_many(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+        """Execute several tool calls concurrently
+        
+        Each tool's max_concurrency is respected. Results are returned in the
+        same order as calls; an exception escaping a call is returned in
+        place of its result rather than raised.
+        """
+        return await asyncio.gather(
+            *(self.execute_tool(name, **kwargs) for name, kwargs in calls),
+            return_exceptions=True
+        )
+    
+    async def warmup(self) -> None:
+        """Warm up all registered tools concurrently; failures are ignored"""
+        await asyncio.gather(
+            *(tool.warmup() for tool in self._tools.values()),
+            return_exceptions=True
+        )
+    
+    async def aclose(self) -> None:
+        """Release resources held by all registered tools"""
+        for tool in self._tools.values():
+            await tool.aclose()
 
 
 # Global tool registry instance
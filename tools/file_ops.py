@@ -4,34 +4,276 @@ File operation tools for the Gemini Coding Agent
 
 import os
 import re
+import asyncio
+import base64
+import errno
+import functools
+import mmap
+import multiprocessing
+import secrets
+import shutil
+import stat
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from aiofile import async_open
 from .base import BaseTool
 
+try:
+    import re2
+except ImportError:
+    re2 = None
 
-class ReadFileTool(BaseTool):
-    """Tool for reading file contents"""
+
+# Number of files scanned per SearchFilesTool worker task
+SEARCH_CHUNK_SIZE = 64
+
+# Files with a NUL byte in this many leading bytes are treated as binary
+BINARY_SNIFF_BYTES = 8192
+
+# Default cap on matches counted by a single search_files call
+DEFAULT_MAX_TOTAL_MATCHES = 1000
+
+# Bulky directories that search_files never descends into (hidden directories are skipped too)
+SKIP_DIRS = frozenset({'.git', 'node_modules', '__pycache__', '.venv', 'dist', 'build'})
+
+_search_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_search_pool() -> ProcessPoolExecutor:
+    """Get the process pool used by SearchFilesTool, creating it on first use"""
+    global _search_pool
+    if _search_pool is None:
+        # The agent is multi-threaded by now (to_thread and aiofile workers),
+        # and forking a threaded process can deadlock the child
+        _search_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("forkserver"))
+    return _search_pool
+
+
+def _discard_search_pool() -> None:
+    """Drop a broken search pool so the next search starts a fresh one"""
+    global _search_pool
+    if _search_pool is not None:
+        _search_pool.shutdown(wait=False, cancel_futures=True)
+        _search_pool = None
+
+
+def _walk(root: str, file_extension: Optional[str] = None) -> Iterator[str]:
+    """Yield paths of files under root, pruning skipped directories
+    
+    The extension filter is applied to entry names before anything else,
+    so non-matching files cost no stat call and no Path object.
+    """
+    ext_lower = file_extension.lower() if file_extension else None
+    stack = [root]
+    
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        
+        with entries:
+            for entry in entries:
+                name = entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not name.startswith('.') and name not in SKIP_DIRS:
+                            stack.append(entry.path)
+                        continue
+                    
+                    if ext_lower and not name.lower().endswith(ext_lower):
+                        continue
+                    
+                    if entry.is_file():
+                        yield entry.path
+                except OSError:
+                    continue
+
+
+def _list_dir(dir_path: str, prefix: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Return sorted (files, directories) entries of a single directory
+    
+    scandir reports entry types from the directory read itself, so only
+    files need an extra stat (for their size).
+    """
+    files = []
+    directories = []
+    files_append = files.append
+    directories_append = directories.append
+    
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                files_append({
+                    "name": entry.name,
+                    "path": prefix + entry.name,
+                    "size": entry.stat().st_size
+                })
+            elif entry.is_dir():
+                directories_append({
+                    "name": entry.name,
+                    "path": prefix + entry.name,
+                    "size": None
+                })
+    
+    # Sort for consistent output
+    files.sort(key=lambda x: x["name"])
+    directories.sort(key=lambda x: x["name"])
+    return files, directories
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_search_pattern(pattern: str):
+    """Compile a case-insensitive search pattern, preferring RE2 when available
+    
+    RE2 matches in linear time, so pathological patterns cannot backtrack
+    for seconds, and it folds case over UTF-8 bytes, so files can be scanned
+    undecoded. Patterns RE2 does not support (e.g. backreferences) fall back
+    to a str pattern from the stdlib re module, whose IGNORECASE is only
+    Unicode-aware for str input; those files are decoded before scanning.
+    """
+    if re2 is not None:
+        options = re2.Options()
+        options.case_sensitive = False
+        options.log_errors = False
+        try:
+            return re2.compile(pattern.encode('utf-8'), options=options)
+        except re2.error:
+            pass
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _scan_chunk(paths: List[str], pattern: str, prefix_len: int, max_matches: int) -> List[Dict[str, Any]]:
+    """Search a chunk of files for a pattern (runs in a worker process)
+    
+    Files are memory-mapped; with RE2 they are scanned as bytes, so files
+    without a match are never decoded, only the sample matches are. Reported
+    paths are the candidate paths with their first `prefix_len` characters
+    (the working directory) sliced off.
+    
+    Scanning stops once `max_matches` matches were counted in the chunk.
+    """
+    pattern_regex = _compile_search_pattern(pattern)
+    scan_bytes = not isinstance(pattern_regex, re.Pattern)
+    matches = []
+    remaining = max_matches
+    
+    for file_path in paths:
+        if remaining <= 0:
+            break
+        
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            # Skip files we can't read
+            continue
+        
+        try:
+            if os.fstat(fd).st_size == 0:
+                continue
+            
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                # Only search text files
+                if mm.find(b'\x00', 0, BINARY_SNIFF_BYTES) != -1:
+                    continue
+                
+                content = mm if scan_bytes else mm[:].decode('utf-8', errors='replace')
+                match_count = 0
+                samples = []
+                for match in pattern_regex.finditer(content):
+                    match_count += 1
+                    if len(samples) < 5:  # First 5 matches
+                        samples.append(match.group(0))
+                    if match_count >= remaining:
+                        break
+        except (OSError, ValueError):
+            continue
+        finally:
+            os.close(fd)
+        
+        if match_count:
+            remaining -= match_count
+            if scan_bytes:
+                samples = [sample.decode('utf-8', errors='replace') for sample in samples]
+            matches.append({
+                "file": file_path[prefix_len:],
+                "matches": match_count,
+                "sample_matches": samples
+            })
+    
+    return matches
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_regex(pattern: str, flags: int = 0) -> re.Pattern:
+    """Compile a regex, cached across tool calls"""
+    return re.compile(pattern, flags)
+
+
+def _sendfile_copy(src: Path, dst: Path) -> int:
+    in_fd = os.open(src, os.O_RDONLY)
+    try:
+        out_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            size = os.fstat(in_fd).st_size
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            return offset
+        finally:
+            os.close(out_fd)
+    finally:
+        os.close(in_fd)
+
+
+def copy_file(src: Path, dst: Path) -> int:
+    """Copy a file's bytes, in the kernel via os.sendfile where available
+    
+    Returns the number of bytes copied. Raises shutil.SameFileError if `dst`
+    is `src` (or a link to it), like shutil.copyfile, instead of truncating it.
+    """
+    try:
+        if os.path.samefile(src, dst):
+            raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+    except FileNotFoundError:
+        pass
+    
+    if hasattr(os, "sendfile"):
+        try:
+            return _sendfile_copy(src, dst)
+        except OSError as e:
+            # sendfile unsupported for this pair of files; copy in user space
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+    shutil.copyfile(src, dst)
+    return os.stat(dst).st_size
+
+
+class _PathSecurity:
+    """Mixin restricting tool paths to the working directory"""
     
     def __init__(self, working_directory: Path):
         self.working_directory = working_directory
+        # Resolved once so each validation only resolves the requested path
+        self._wd_resolved = working_directory.resolve()
+        self._wd_str = str(self._wd_resolved)
+        # Working directory with a trailing separator: paths inside it start
+        # with this, and slicing it off gives their relative path
+        self._wd_prefix = os.path.join(self._wd_str, "")
+        self._wd_len = len(self._wd_prefix)
     
-    @property
-    def name(self) -> str:
-        return "read_file"
-    
-    @property
-    def description(self) -> str:
-        return "Read the contents of a file"
+    def _is_inside(self, abs_path: str) -> bool:
+        # The trailing separator keeps "/wd-other" from matching "/wd"
+        return abs_path == self._wd_str or abs_path.startswith(self._wd_prefix)
     
-    @property
-    def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "path": {"type": "string", "description": "The path to the file to read"}
-            },
-            "required": ["path"]
-        }
+    def _relative(self, abs_path: str) -> str:
+        """Path relative to the working directory, for a path inside it"""
+        return abs_path[self._wd_len:] if abs_path != self._wd_str else "."
     
     def _validate_path_security(self, path: str) -> Tuple[bool, Optional[Path]]:
         """Validate that a path is within the working directory for security"""
@@ -39,37 +281,93 @@ class ReadFileTool(BaseTool):
             if os.path.isabs(path):
                 return False, None
             
-            file_path = (self.working_directory / path).resolve()
+            joined = os.path.join(self._wd_str, path)
+            
+            # Cheap lexical check first, rejecting "../" escapes without
+            # touching the filesystem
+            if not self._is_inside(os.path.normpath(joined)):
+                return False, None
             
-            if not str(file_path).startswith(str(self.working_directory)):
+            # Then resolve symlinks, which may still point outside
+            real_path = os.path.realpath(joined)
+            if not self._is_inside(real_path):
                 return False, None
                 
-            return True, file_path
+            return True, Path(real_path)
         except Exception:
             return False, None
+
+
+class ReadFileTool(_PathSecurity, BaseTool):
+    """Tool for reading file contents"""
+    
+    max_concurrency = 32
+    
+    _NAME = "read_file"
+    _DESCRIPTION = "Read the contents of a file"
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "path": {"type": "string", "description": "The path to the file to read"},
+            "binary": {
+                "type": "boolean",
+                "description": "Return the raw bytes base64-encoded instead of decoding as UTF-8 text (default: false)",
+                "default": False
+            }
+        },
+        "required": ["path"]
+    }
+    
+    @property
+    def name(self) -> str:
+        return self._NAME
+    
+    @property
+    def description(self) -> str:
+        return self._DESCRIPTION
     
-    async def execute(self, path: str = "", **kwargs) -> Dict[str, Any]:
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        return self._PARAMETERS
+    
+    async def execute(self, path: str = "", binary: bool = False, **kwargs) -> Dict[str, Any]:
         """Read a file and return its contents"""
         try:
             is_valid, file_path = self._validate_path_security(path)
             if not is_valid:
                 return {"error": "Access denied: path outside working directory or invalid path"}
             
-            if not file_path.exists():
+            # One stat serves the existence check, the type check and the size
+            try:
+                file_stat = await asyncio.to_thread(os.stat, file_path)
+            except (FileNotFoundError, NotADirectoryError):
                 return {"error": f"File not found: {path}"}
             
-            if not file_path.is_file():
+            if not stat.S_ISREG(file_stat.st_mode):
                 return {"error": f"Path is not a file: {path}"}
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            if binary:
+                # Raw bytes skip UTF-8 decoding and validation entirely
+                async with async_open(file_path, 'rb') as f:
+                    raw = await f.read()
+                content = base64.b64encode(raw).decode('ascii')
+            else:
+                async with async_open(file_path, 'r', encoding='utf-8') as f:
+                    content = await f.read()
+                # aiofile does no newline translation; match open()'s
+                # universal newlines so CRLF files read as before
+                if '\r' in content:
+                    content = content.replace('\r\n', '\n').replace('\r', '\n')
             
-            return {
+            result = {
                 "success": True, 
                 "content": content, 
-                "path": str(file_path.relative_to(self.working_directory)),
-                "size": file_path.stat().st_size
+                "path": self._relative(str(file_path)),
+                "size": file_stat.st_size
             }
+            if binary:
+                result["encoding"] = "base64"
+            return result
         except UnicodeDecodeError:
             return {"error": f"File is not readable as UTF-8 text: {path}"}
         except PermissionError:
@@ -78,45 +376,34 @@ class ReadFileTool(BaseTool):
             return {"error": f"Could not read file: {str(e)}"}
 
 
-class WriteFileTool(BaseTool):
+class WriteFileTool(_PathSecurity, BaseTool):
     """Tool for writing content to files"""
     
-    def __init__(self, working_directory: Path):
-        self.working_directory = working_directory
+    # Serialized so writes to the same path land in call order
+    max_concurrency = 1
+    
+    _NAME = "write_file"
+    _DESCRIPTION = "Write content to a file"
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "path": {"type": "string", "description": "The path to the file to write"},
+            "content": {"type": "string", "description": "The content to write to the file"}
+        },
+        "required": ["path", "content"]
+    }
     
     @property
     def name(self) -> str:
-        return "write_file"
+        return self._NAME
     
     @property
     def description(self) -> str:
-        return "Write content to a file"
+        return self._DESCRIPTION
     
     @property
     def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "path": {"type": "string", "description": "The path to the file to write"},
-                "content": {"type": "string", "description": "The content to write to the file"}
-            },
-            "required": ["path", "content"]
-        }
-    
-    def _validate_path_security(self, path: str) -> Tuple[bool, Optional[Path]]:
-        """Validate that a path is within the working directory for security"""
-        try:
-            if os.path.isabs(path):
-                return False, None
-            
-            file_path = (self.working_directory / path).resolve()
-            
-            if not str(file_path).startswith(str(self.working_directory)):
-                return False, None
-                
-            return True, file_path
-        except Exception:
-            return False, None
+        return self._PARAMETERS
     
     async def execute(self, path: str = "", content: str = "", **kwargs) -> Dict[str, Any]:
         """Write content to a file"""
@@ -125,16 +412,36 @@ class WriteFileTool(BaseTool):
             if not is_valid:
                 return {"error": "Access denied: path outside working directory or invalid path"}
             
+            # The temporary file goes next to the target, so a directory
+            # (possibly the working directory itself) must be rejected first
+            if str(file_path) == self._wd_str or file_path.is_dir():
+                return {"error": f"Path is a directory: {path}"}
+            
             # Create parent directories if they don't exist
             file_path.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            # Encode once; the byte count doubles as the reported size
+            data = content.encode('utf-8')
+            
+            # Write to a temporary file next to the target and swap it in, so
+            # a failed write never leaves a half-written file behind
+            tmp_path = file_path.with_name(f".{file_path.name}.{secrets.token_hex(4)}.tmp")
+            try:
+                async with async_open(tmp_path, 'wb') as f:
+                    await f.write(data)
+                try:
+                    os.chmod(tmp_path, stat.S_IMODE(os.stat(file_path).st_mode))
+                except FileNotFoundError:
+                    pass
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
             
             return {
                 "success": True,
-                "path": str(file_path.relative_to(self.working_directory)),
-                "size": len(content.encode('utf-8')),
+                "path": self._relative(str(file_path)),
+                "size": len(data),
                 "message": f"File written successfully: {path}"
             }
         except PermissionError:
@@ -145,44 +452,30 @@ class WriteFileTool(BaseTool):
             return {"error": f"Could not write file: {str(e)}"}
 
 
-class ListFilesTool(BaseTool):
+class ListFilesTool(_PathSecurity, BaseTool):
     """Tool for listing files and directories"""
     
-    def __init__(self, working_directory: Path):
-        self.working_directory = working_directory
+    _NAME = "list_files"
+    _DESCRIPTION = "List files and directories in a given path"
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "path": {"type": "string", "description": "The directory path to list files from"}
+        },
+        "required": ["path"]
+    }
     
     @property
     def name(self) -> str:
-        return "list_files"
+        return self._NAME
     
     @property
     def description(self) -> str:
-        return "List files and directories in a given path"
+        return self._DESCRIPTION
     
     @property
     def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "path": {"type": "string", "description": "The directory path to list files from"}
-            },
-            "required": ["path"]
-        }
-    
-    def _validate_path_security(self, path: str) -> Tuple[bool, Optional[Path]]:
-        """Validate that a path is within the working directory for security"""
-        try:
-            if os.path.isabs(path):
-                return False, None
-            
-            file_path = (self.working_directory / path).resolve()
-            
-            if not str(file_path).startswith(str(self.working_directory)):
-                return False, None
-                
-            return True, file_path
-        except Exception:
-            return False, None
+        return self._PARAMETERS
     
     async def execute(self, path: str = ".", **kwargs) -> Dict[str, Any]:
         """List files and directories in a given path"""
@@ -191,35 +484,25 @@ class ListFilesTool(BaseTool):
             if not is_valid:
                 return {"error": "Access denied: path outside working directory or invalid path"}
             
-            if not dir_path.exists():
+            try:
+                dir_stat = await asyncio.to_thread(os.stat, dir_path)
+            except (FileNotFoundError, NotADirectoryError):
                 return {"error": f"Directory not found: {path}"}
             
-            if not dir_path.is_dir():
+            if not stat.S_ISDIR(dir_stat.st_mode):
                 return {"error": f"Path is not a directory: {path}"}
             
-            files = []
-            directories = []
+            # Entry paths are built from the listed directory's relative path,
+            # avoiding a Path object and relative_to() per entry
+            relative_dir = self._relative(str(dir_path))
+            prefix = "" if relative_dir == "." else relative_dir + os.sep
             
-            for item in dir_path.iterdir():
-                relative_path = str(item.relative_to(self.working_directory))
-                item_info = {
-                    "name": item.name,
-                    "path": relative_path,
-                    "size": item.stat().st_size if item.is_file() else None
-                }
-                
-                if item.is_file():
-                    files.append(item_info)
-                elif item.is_dir():
-                    directories.append(item_info)
-            
-            # Sort for consistent output
-            files.sort(key=lambda x: x["name"])
-            directories.sort(key=lambda x: x["name"])
+            # The scan stats every file, so keep it off the event loop
+            files, directories = await asyncio.to_thread(_list_dir, str(dir_path), prefix)
             
             return {
                 "success": True,
-                "path": str(dir_path.relative_to(self.working_directory)),
+                "path": relative_dir,
                 "directories": directories,
                 "files": files,
                 "total_items": len(files) + len(directories)
@@ -230,98 +513,127 @@ class ListFilesTool(BaseTool):
             return {"error": f"Could not list directory: {str(e)}"}
 
 
-class SearchFilesTool(BaseTool):
+class SearchFilesTool(_PathSecurity, BaseTool):
     """Tool for searching text patterns in files"""
     
-    def __init__(self, working_directory: Path):
-        self.working_directory = working_directory
+    _NAME = "search_files"
+    _DESCRIPTION = "Search for text patterns in files within a directory"
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "path": {"type": "string", "description": "The directory path to search in"},
+            "pattern": {"type": "string", "description": "The text pattern to search for"},
+            "file_extension": {"type": "string", "description": "Optional file extension filter (e.g., '.py', '.js')"},
+            "max_total_matches": {
+                "type": "integer",
+                "description": "Stop searching once this many matches were found (default: 1000)",
+                "default": DEFAULT_MAX_TOTAL_MATCHES
+            }
+        },
+        "required": ["path", "pattern"]
+    }
     
     @property
     def name(self) -> str:
-        return "search_files"
+        return self._NAME
     
     @property
     def description(self) -> str:
-        return "Search for text patterns in files within a directory"
+        return self._DESCRIPTION
     
     @property
     def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "path": {"type": "string", "description": "The directory path to search in"},
-                "pattern": {"type": "string", "description": "The text pattern to search for"},
-                "file_extension": {"type": "string", "description": "Optional file extension filter (e.g., '.py', '.js')"}
-            },
-            "required": ["path", "pattern"]
-        }
+        return self._PARAMETERS
     
-    def _validate_path_security(self, path: str) -> Tuple[bool, Optional[Path]]:
-        """Validate that a path is within the working directory for security"""
+    async def _scan_chunks(self, chunks: List[List[str]], pattern: str, max_total_matches: int,
+                           use_pool: bool) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """Scan candidate chunks for a pattern in worker processes or threads
+        
+        Returns the matches in walk order, their total count and whether the
+        scan stopped early at max_total_matches.
+        """
+        if use_pool:
+            loop = asyncio.get_running_loop()
+            pool = _get_search_pool()
+            futures = [
+                loop.run_in_executor(pool, _scan_chunk, chunk, pattern, self._wd_len, max_total_matches)
+                for chunk in chunks
+            ]
+        else:
+            futures = [asyncio.ensure_future(asyncio.to_thread(
+                _scan_chunk, chunk, pattern, self._wd_len, max_total_matches
+            )) for chunk in chunks]
+        
+        # Collect chunk results in walk order, dropping the chunks still
+        # queued once enough matches were found
+        matches = []
+        total_matches = 0
+        truncated = False
         try:
-            if os.path.isabs(path):
-                return False, None
-            
-            file_path = (self.working_directory / path).resolve()
-            
-            if not str(file_path).startswith(str(self.working_directory)):
-                return False, None
-                
-            return True, file_path
-        except Exception:
-            return False, None
+            for future in futures:
+                for match in await future:
+                    matches.append(match)
+                    total_matches += match["matches"]
+                    if total_matches >= max_total_matches:
+                        truncated = True
+                        break
+                if truncated:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+        
+        return matches, total_matches, truncated
     
-    async def execute(self, pattern: str = "", path: str = ".", file_extension: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+    async def execute(self, pattern: str = "", path: str = ".", file_extension: Optional[str] = None,
+                      max_total_matches: int = DEFAULT_MAX_TOTAL_MATCHES, **kwargs) -> Dict[str, Any]:
         """Search for text patterns in files within a directory"""
         try:
             is_valid, search_path = self._validate_path_security(path)
             if not is_valid:
                 return {"error": "Access denied: path outside working directory or invalid path"}
             
-            if not search_path.exists():
+            try:
+                dir_stat = await asyncio.to_thread(os.stat, search_path)
+            except (FileNotFoundError, NotADirectoryError):
                 return {"error": f"Directory not found: {path}"}
             
-            if not search_path.is_dir():
+            if not stat.S_ISDIR(dir_stat.st_mode):
                 return {"error": f"Path is not a directory: {path}"}
             
-            matches = []
-            pattern_regex = re.compile(pattern, re.IGNORECASE)
+            # Validate the pattern before dispatching work
+            _compile_regex(pattern, re.IGNORECASE)
             
-            # Walk through directory recursively
-            for file_path in search_path.rglob("*"):
-                if not file_path.is_file():
-                    continue
-                
-                # Filter by file extension if specified
-                if file_extension and not file_path.name.lower().endswith(file_extension.lower()):
-                    continue
-                
-                try:
-                    # Only search text files
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        
-                    # Search for pattern in content
-                    pattern_matches = pattern_regex.findall(content)
-                    if pattern_matches:
-                        relative_path = str(file_path.relative_to(self.working_directory))
-                        matches.append({
-                            "file": relative_path,
-                            "matches": len(pattern_matches),
-                            "sample_matches": pattern_matches[:5]  # First 5 matches
-                        })
-                        
-                except (UnicodeDecodeError, PermissionError):
-                    # Skip binary files or files we can't read
-                    continue
+            # Walk through directory recursively, filtering by file extension if specified
+            # (in a thread, the scandir calls would otherwise block the event loop)
+            candidates = await asyncio.to_thread(list, _walk(str(search_path), file_extension))
+            
+            chunks = [candidates[i:i + SEARCH_CHUNK_SIZE] for i in range(0, len(candidates), SEARCH_CHUNK_SIZE)]
+            max_total_matches = max(1, int(max_total_matches))
+            
+            # A single chunk is not worth a round trip through the process pool
+            use_pool = len(chunks) > 1
+            try:
+                matches, total_matches, truncated = await self._scan_chunks(
+                    chunks, pattern, max_total_matches, use_pool
+                )
+            except BrokenProcessPool:
+                # A worker died (e.g. killed by the OOM killer); start a fresh
+                # pool next time and finish this search in threads
+                _discard_search_pool()
+                matches, total_matches, truncated = await self._scan_chunks(
+                    chunks, pattern, max_total_matches, use_pool=False
+                )
             
             return {
                 "success": True,
                 "pattern": pattern,
-                "search_path": str(search_path.relative_to(self.working_directory)),
+                "search_path": self._relative(str(search_path)),
                 "file_extension": file_extension,
                 "matches": matches,
-                "total_files_with_matches": len(matches)
+                "total_files_with_matches": len(matches),
+                "total_matches": total_matches,
+                "truncated": truncated
             }
         except Exception as e:
             return {"error": f"Could not search files: {str(e)}"}
@@ -0,0 +1,110 @@
+"""
+Append-only conversation history log for the Gemini Coding Agent
+
+Each record is a msgpack-encoded message prefixed with its 4-byte
+big-endian length, so saving a turn only appends the new messages
+instead of rewriting the whole history.
+"""
+
+import mmap
+import os
+import struct
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+import msgpack
+
+
+_LENGTH_PREFIX = struct.Struct(">I")
+
+
+def _encode_record(message: Dict[str, Any]) -> bytes:
+    """Encode a message as a length-prefixed msgpack record"""
+    payload = msgpack.packb(message, use_bin_type=True)
+    return _LENGTH_PREFIX.pack(len(payload)) + payload
+
+
+def append_message(path: Path, message: Dict[str, Any]) -> None:
+    """Append a single message to the history log"""
+    with open(path, 'ab') as f:
+        f.write(_encode_record(message))
+
+
+def write_all(path: Path, messages: Iterable[Dict[str, Any]]) -> None:
+    """Rewrite the history log so it contains exactly the given messages"""
+    with open(path, 'wb') as f:
+        f.write(b"".join(_encode_record(message) for message in messages))
+
+
+def _truncate_torn_tail(path: Path, valid_size: int, size: int) -> None:
+    """Cut off a partial trailing record so later appends stay readable"""
+    if valid_size < size:
+        os.truncate(path, valid_size)
+
+
+def load_all(path: Path) -> List[Dict[str, Any]]:
+    """Load every message from the history log
+
+    A truncated trailing record (e.g. from an interrupted write) is removed
+    from the file, since records appended after it would be unreadable.
+    """
+    messages = []
+    unpacker = msgpack.Unpacker(raw=False)
+    valid_size = 0
+
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(_LENGTH_PREFIX.size)
+            if len(header) < _LENGTH_PREFIX.size:
+                break
+
+            (length,) = _LENGTH_PREFIX.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                break
+
+            unpacker.feed(payload)
+            messages.extend(unpacker)
+            valid_size += _LENGTH_PREFIX.size + length
+
+        size = f.seek(0, 2)
+
+    _truncate_torn_tail(path, valid_size, size)
+    return messages
+
+
+def load_tail(path: Path, n: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Load the last `n` messages from the history log
+
+    The file is memory-mapped and only the length prefixes are read while
+    hopping from record to record; just the final `n` records are decoded.
+    A truncated trailing record is removed from the file, as in load_all.
+
+    Returns:
+        The last `n` messages and the total number of records in the log
+    """
+    with open(path, 'rb') as f:
+        size = f.seek(0, 2)
+        if size == 0 or n <= 0:
+            return [], 0
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offsets = deque(maxlen=n)
+            total = 0
+            position = 0
+
+            while position + _LENGTH_PREFIX.size <= size:
+                (length,) = _LENGTH_PREFIX.unpack_from(mm, position)
+                start = position + _LENGTH_PREFIX.size
+                if start + length > size:
+                    break
+
+                offsets.append((start, length))
+                total += 1
+                position = start + length
+
+            messages = [msgpack.unpackb(mm[start:start + length], raw=False) for start, length in offsets]
+
+    _truncate_torn_tail(path, position, size)
+    return messages, total
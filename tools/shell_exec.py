@@ -3,71 +3,326 @@ Shell execution tools for the Gemini Coding Agent
 """
 
 import asyncio
+import functools
+import os
+import secrets
+import shlex
+import shutil
+import signal
+import tempfile
 from pathlib import Path
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Tuple
 from .base import BaseTool
 
 
+# Idle shell workers kept around for reuse
+MAX_IDLE_WORKERS = 2
+
+READ_CHUNK_SIZE = 65536
+
+# Output kept per stream; a command writing more than this is killed
+MAX_OUTPUT_BYTES = 1024 * 1024
+TRUNCATION_NOTE = f"\n[output truncated at {MAX_OUTPUT_BYTES} bytes, command killed]".encode()
+
+
+def _kill_process_group(proc: asyncio.subprocess.Process) -> None:
+    """SIGKILL a process started with start_new_session and everything it started"""
+    if proc.returncode is None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class _WorkerUnavailable(Exception):
+    """The shell worker exited before it could be sent a command"""
+
+
+async def _read_output(stream: asyncio.StreamReader, on_overflow: Callable[[], None]) -> bytes:
+    """Read a command's output from a stream until EOF
+    
+    At most MAX_OUTPUT_BYTES are kept: past that on_overflow() is called to
+    kill the command and the rest of the stream is discarded.
+    """
+    buf = bytearray()
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return bytes(buf)
+        
+        buf += chunk
+        if len(buf) > MAX_OUTPUT_BYTES:
+            on_overflow()
+            while await stream.read(READ_CHUNK_SIZE):
+                pass
+            return bytes(buf[:MAX_OUTPUT_BYTES]) + TRUNCATION_NOTE
+
+
+class _FifoReader:
+    """Collects one command's output from a FIFO on the event loop
+    
+    The reader holds a write end of the FIFO itself, so reads never report
+    EOF; the caller decides when the output is complete.
+    """
+    
+    def __init__(self, path: str, on_overflow: Callable[[], None]):
+        self._fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        self._write_fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        self._on_overflow = on_overflow
+        self._buf = bytearray()
+        self._overflowed = False
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._fd, self._read)
+    
+    def _read(self) -> bool:
+        """Read one chunk; returns False once the FIFO is drained"""
+        try:
+            chunk = os.read(self._fd, READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return False
+        if not chunk:
+            return False
+        
+        if not self._overflowed:
+            self._buf += chunk
+            if len(self._buf) > MAX_OUTPUT_BYTES:
+                self._overflowed = True
+                self._on_overflow()
+        return True
+    
+    def finish(self) -> bytes:
+        """Return the output, including anything still buffered in the FIFO"""
+        while self._read():
+            pass
+        if self._overflowed:
+            return bytes(self._buf[:MAX_OUTPUT_BYTES]) + TRUNCATION_NOTE
+        return bytes(self._buf)
+    
+    def close(self) -> None:
+        self._loop.remove_reader(self._fd)
+        os.close(self._fd)
+        os.close(self._write_fd)
+
+
+class _ShellWorker:
+    """A persistent `sh -s` process that runs commands written to its stdin
+    
+    Each command runs in a subshell, so `cd`, variable assignments and `exit`
+    don't leak into later commands. Its stdout and stderr go to FIFOs made
+    for that one command, so background jobs it leaves behind can't write
+    into the output of later commands. Once the subshell exits, the worker
+    prints a random marker with the exit status on its own stdout.
+    """
+    
+    def __init__(self, proc: asyncio.subprocess.Process, fifo_dir: str):
+        self.proc = proc
+        self._fifo_dir = fifo_dir
+    
+    @classmethod
+    async def start(cls, cwd: str) -> "_ShellWorker":
+        fifo_dir = tempfile.mkdtemp(prefix="agent-sh-")
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "/bin/sh", "-s",
+                cwd=cwd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                # Own process group, so a timed out command can be killed with
+                # everything it started
+                start_new_session=True
+            )
+        except BaseException:
+            shutil.rmtree(fifo_dir, ignore_errors=True)
+            raise
+        return cls(proc, fifo_dir)
+    
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+    
+    async def run(self, command: str) -> Tuple[bytes, bytes, int]:
+        """Run a command and return its stdout, stderr and exit code"""
+        token = secrets.token_hex(8)
+        marker = f"__agent_done_{token}__"
+        out_path = os.path.join(self._fifo_dir, f"{token}.out")
+        err_path = os.path.join(self._fifo_dir, f"{token}.err")
+        os.mkfifo(out_path, 0o600)
+        os.mkfifo(err_path, 0o600)
+        
+        readers = []
+        try:
+            readers.append(_FifoReader(out_path, self._kill_group))
+            readers.append(_FifoReader(err_path, self._kill_group))
+            
+            script = (
+                f"( eval {shlex.quote(command)}\n) </dev/null >{shlex.quote(out_path)} 2>{shlex.quote(err_path)}\n"
+                f"printf '%s %d\\n' {marker} $?\n"
+            )
+            try:
+                self.proc.stdin.write(script.encode('utf-8', errors='surrogateescape'))
+                await self.proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError) as e:
+                raise _WorkerUnavailable() from e
+            
+            status_line = await self.proc.stdout.readline()
+            stdout, stderr = readers[0].finish(), readers[1].finish()
+            
+            fields = status_line.split()
+            if len(fields) != 2 or fields[0] != marker.encode():
+                # The command took the worker down with it (e.g. `kill $$`), or
+                # was killed for writing too much output
+                _kill_process_group(self.proc)
+                return stdout, stderr, await self.proc.wait()
+            return stdout, stderr, int(fields[1])
+        finally:
+            for reader in readers:
+                reader.close()
+            os.unlink(out_path)
+            os.unlink(err_path)
+    
+    def _kill_group(self) -> None:
+        _kill_process_group(self.proc)
+    
+    async def kill(self) -> None:
+        """Kill the worker and any command still running in it"""
+        self._kill_group()
+        await self.proc.wait()
+        shutil.rmtree(self._fifo_dir, ignore_errors=True)
+    
+    async def close(self) -> None:
+        """Let an idle worker exit by closing its stdin"""
+        self.proc.stdin.close()
+        try:
+            await asyncio.wait_for(self.proc.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            await self.kill()
+        shutil.rmtree(self._fifo_dir, ignore_errors=True)
+
+
 class ShellExecTool(BaseTool):
     """Tool for executing shell commands in the working directory"""
     
+    # Commands may depend on each other's side effects, so run one at a time
+    max_concurrency = 1
+    
+    _NAME = "shell_exec"
+    _DESCRIPTION = "Run a shell command in the agent's working directory and return stdout, stderr, and exit code."
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "command": {
+                "type": "string",
+                "description": "Shell command to run"
+            }
+        },
+        "required": ["command"]
+    }
+    
     def __init__(self, working_directory: Path):
         self.working_directory = working_directory
+        self._idle_workers: List[_ShellWorker] = []
     
     @property
     def name(self) -> str:
-        return "shell_exec"
+        return self._NAME
     
     @property
     def description(self) -> str:
-        return "Run a shell command in the agent's working directory and return stdout, stderr, and exit code."
+        return self._DESCRIPTION
     
     @property
     def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "command": {
-                    "type": "string",
-                    "description": "Shell command to run"
-                }
-            },
-            "required": ["command"]
-        }
+        return self._PARAMETERS
+    
+    async def warmup(self) -> None:
+        """Start a shell worker so the first command doesn't pay for the spawn"""
+        if not self._idle_workers:
+            try:
+                self._idle_workers.append(await _ShellWorker.start(self._cwd()))
+            except OSError:
+                pass
+    
+    async def aclose(self) -> None:
+        """Shut down idle shell workers"""
+        workers, self._idle_workers = self._idle_workers, []
+        for worker in workers:
+            await worker.close()
+    
+    def _cwd(self) -> str:
+        return str(self.working_directory.resolve())
+    
+    async def _run(self, command: str) -> Tuple[bytes, bytes, int]:
+        """Run a command, preferring an idle shell worker over a fresh subprocess"""
+        if "\0" in command:
+            return await self._run_subprocess(command)
+        
+        try:
+            worker = self._idle_workers.pop() if self._idle_workers else await _ShellWorker.start(self._cwd())
+        except OSError:
+            return await self._run_subprocess(command)
+        
+        try:
+            stdout, stderr, returncode = await worker.run(command)
+        except _WorkerUnavailable:
+            # The worker died while idle; the command was never started
+            await worker.kill()
+            return await self._run_subprocess(command)
+        except BaseException:
+            # Timed out or cancelled: take down the command with its worker
+            await worker.kill()
+            raise
+        
+        if worker.alive and len(self._idle_workers) < MAX_IDLE_WORKERS:
+            self._idle_workers.append(worker)
+        else:
+            await worker.kill()
+        return stdout, stderr, returncode
+    
+    async def _run_subprocess(self, command: str) -> Tuple[bytes, bytes, int]:
+        """Run a command in a fresh `sh -c` subprocess"""
+        proc = await asyncio.create_subprocess_shell(
+            command,
+            cwd=self._cwd(),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
+        )
+        kill = functools.partial(_kill_process_group, proc)
+        try:
+            stdout, stderr, returncode = await asyncio.gather(
+                _read_output(proc.stdout, kill),
+                _read_output(proc.stderr, kill),
+                proc.wait()
+            )
+        except BaseException:
+            # Kill the process if it times out
+            kill()
+            await proc.wait()  # Wait for the process to be killed
+            raise
+        return stdout, stderr, returncode
     
     async def execute(self, command: str = "", **kwargs) -> Dict[str, Any]:
         """Execute a shell command in the working directory"""
         if not command.strip():
             return {"error": "Command cannot be empty"}
         
-        cwd = str(self.working_directory.resolve())
-        
         try:
-            # Create subprocess with timeout
-            proc = await asyncio.create_subprocess_shell(
-                command,
-                cwd=cwd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
             try:
                 # Wait for completion with 10-second timeout
-                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=10)
+                stdout, stderr, returncode = await asyncio.wait_for(self._run(command), timeout=10)
                 
                 return {
-                    "success": proc.returncode == 0,
+                    "success": returncode == 0,
                     "stdout": stdout.decode('utf-8', errors='replace'),
                     "stderr": stderr.decode('utf-8', errors='replace'),
-                    "exit_code": proc.returncode,
+                    "exit_code": returncode,
                     "command": command,
                     "working_directory": str(self.working_directory)
                 }
                 
             except asyncio.TimeoutError:
-                # Kill the process if it times out
-                proc.kill()
-                await proc.wait()  # Wait for the process to be killed
                 return {
                     "error": "Execution timed out after 10 seconds",
                     "command": command,
@@ -3,47 +3,112 @@ Web search tools using Brave Search API for the Gemini Coding Agent
 """
 
 import os
-import requests
-from typing import Dict, Any, Optional
+import copy
+import json
+import time
+import importlib.util
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import httpx
 from .base import BaseTool
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# HTTP/2 needs the optional h2 package
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# httpx only decodes brotli responses when a brotli package is installed
+_ACCEPT_ENCODING = (
+    "gzip, br"
+    if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi")
+    else "gzip"
+)
+
+# Successful searches are cached in memory, keyed on normalized query and count
+SEARCH_CACHE_TTL = 300.0
+SEARCH_CACHE_SIZE = 256
+
 
 class WebSearchTool(BaseTool):
     """Tool for web searching using Brave Search API"""
     
+    max_concurrency = 4
+    
+    _NAME = "web_search"
+    _DESCRIPTION = "Search the web for information using Brave Search API. Returns web search results with titles, descriptions, and URLs."
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string", 
+                "description": "The search query to look up on the web"
+            },
+            "count": {
+                "type": "integer",
+                "description": "Number of search results to return (default: 10, max: 20)",
+                "default": 10
+            }
+        },
+        "required": ["query"]
+    }
+    
     def __init__(self):
         self.api_key = os.getenv("BRAVE_API_KEY")
         self.base_url = "https://api.search.brave.com/res/v1/web/search"
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the pooled HTTP client, creating it on first use"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={
+                    "Accept": "application/json",
+                    "Accept-Encoding": _ACCEPT_ENCODING,
+                    "X-Subscription-Token": self.api_key or ""
+                },
+                http2=_HTTP2_AVAILABLE,
+                timeout=10.0
+            )
+        return self._client
+    
+    async def warmup(self) -> None:
+        """Open the connection to the Brave API ahead of the first search
+        
+        Sends a HEAD request, which sets up the TLS (and HTTP/2) session
+        without running a search or using API quota.
+        """
+        if not self.api_key:
+            return
+        try:
+            await self._get_client().head(self.base_url)
+        except httpx.HTTPError:
+            pass
+    
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     @property
     def name(self) -> str:
-        return "web_search"
+        return self._NAME
     
     @property
     def description(self) -> str:
-        return "Search the web for information using Brave Search API. Returns web search results with titles, descriptions, and URLs."
+        return self._DESCRIPTION
     
     @property
     def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "query": {
-                    "type": "string", 
-                    "description": "The search query to look up on the web"
-                },
-                "count": {
-                    "type": "integer",
-                    "description": "Number of search results to return (default: 10, max: 20)",
-                    "default": 10
-                }
-            },
-            "required": ["query"]
-        }
+        return self._PARAMETERS
     
     async def execute(self, query: str = "", count: int = 10, **kwargs) -> Dict[str, Any]:
         """Execute web search using Brave Search API"""
-        
         if not query.strip():
             return {"error": "Search query cannot be empty"}
         
@@ -58,27 +123,28 @@ class WebSearchTool(BaseTool):
         elif count > 20:
             count = 20
         
+        # Serve repeated searches from the cache
+        key = (query.strip().lower(), count)
+        cached = self._cache.get(key)
+        if cached is not None:
+            stored_at, cached_result = cached
+            if time.monotonic() - stored_at < SEARCH_CACHE_TTL:
+                self._cache.move_to_end(key)
+                result = copy.deepcopy(cached_result)
+                result["query"] = query
+                result["cached"] = True
+                return result
+            del self._cache[key]
+        
         try:
-            # Prepare headers
-            headers = {
-                "Accept": "application/json",
-                "Accept-Encoding": "gzip",
-                "X-Subscription-Token": self.api_key
-            }
-            
             # Prepare parameters
             params = {
                 "q": query,
                 "count": count
             }
             
-            # Make the API request
-            response = requests.get(
-                self.base_url,
-                headers=headers,
-                params=params,
-                timeout=10
-            )
+            # Make the API request over the pooled connection
+            response = await self._get_client().get(self.base_url, params=params)
             
             # Check if request was successful
             if response.status_code != 200:
@@ -87,7 +153,7 @@ class WebSearchTool(BaseTool):
                 }
             
             # Parse JSON response
-            data = response.json()
+            data = orjson.loads(response.content) if orjson else json.loads(response.content)
             
             # Extract search results
             results = []
@@ -106,7 +172,7 @@ class WebSearchTool(BaseTool):
             # Get additional info
             query_info = data.get("query", {})
             
-            return {
+            result = {
                 "success": True,
                 "query": query,
                 "results_count": len(results),
@@ -115,13 +181,19 @@ class WebSearchTool(BaseTool):
                 "api_response_time": response.elapsed.total_seconds() if response.elapsed else None
             }
             
-        except requests.exceptions.Timeout:
+            self._cache[key] = (time.monotonic(), copy.deepcopy(result))
+            if len(self._cache) > SEARCH_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            
+            return result
+            
+        except httpx.TimeoutException:
             return {"error": "Search request timed out after 10 seconds"}
         
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             return {"error": "Failed to connect to Brave Search API. Check your internet connection."}
         
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {"error": f"Request failed: {str(e)}"}
         
         except ValueError as e: